@@ -0,0 +1,168 @@
+#!/usr/bin/env python2.7
+
+"""
+decompress sec1 compressed public keys in bulk - read 33 byte compressed keys
+from a file or pipe and write the 65 byte uncompressed keys, in the same order.
+
+run like so:
+
+    ./decompress_keys.py compressed.bin uncompressed.bin
+
+or leave out the filenames to read from stdin and write to stdout:
+
+    cat compressed.bin | ./decompress_keys.py > uncompressed.bin
+
+the y coordinate of each key is calculated with y_ec_mod() in grunt.py, with the
+key's prefix byte (0x02 for even y, 0x03 for odd y) taking the place of the
+yp_pos flag in y_ec(). each key is checked to be on the curve. by default the
+first invalid key stops the run with an error - use --skip-invalid to leave
+invalid keys out of the output and just count them instead.
+
+keys are read a chunk at a time and decompressed in a pool of worker
+processes. only a few chunks per process are ever in memory at once, so there is
+no limit on the number of keys. the square root for each key dominates the
+run time, so the throughput grows with the number of cpus - each one manages a
+few hundred thousand keys per minute.
+"""
+
+from grunt import *
+import sys, time, argparse, collections
+
+compressed_size = 33
+uncompressed_size = 65
+
+def decompress_chunk(data):
+	"""
+	decompress a chunk of concatenated compressed keys. this runs in the worker
+	processes. return the concatenated uncompressed keys and a list of the
+	indexes (within the chunk) of any invalid keys, which are left out.
+	"""
+	records = numpy.frombuffer(data, numpy.uint8).reshape(-1, compressed_size)
+	try:
+		return (decompress_records(records), [])
+	except ValueError:
+		pass
+
+	# find the invalid keys one at a time
+	valid = []
+	invalid = []
+	for i in xrange(len(records)):
+		try:
+			valid.append(decompress_records(records[i: i + 1]))
+		except ValueError:
+			invalid.append(i)
+	return ("".join(valid), invalid)
+
+def decompress_records(records):
+	"""
+	decompress an (n, 33) array of compressed keys and return the concatenated
+	uncompressed keys. raise a ValueError if any key is invalid.
+	"""
+	batch = PointBatch.decode(records)
+	# the point at infinity is not a valid public key
+	if batch.infinities().any():
+		raise ValueError("the point at infinity is not a public key")
+	return batch.encode(compressed = False).tostring()
+
+def read_chunks(f, chunk_keys):
+	"""yield chunks of upto chunk_keys compressed keys from file f"""
+	while True:
+		data = f.read(chunk_keys * compressed_size)
+		if not data:
+			return
+		if len(data) % compressed_size:
+			raise ValueError(
+				"the input is not a whole number of %d byte keys"
+				% compressed_size
+			)
+		yield data
+
+def decompress_file(
+	in_file, out_file, chunk_keys = 4096, processes = None,
+	skip_invalid = False
+):
+	"""
+	decompress all the keys in in_file and write them to out_file. at most two
+	chunks per worker process are queued at a time, and the results are
+	written as soon as each chunk (in order) is done.
+
+	return the number of keys decompressed and the number of invalid keys.
+	"""
+	processes = processes or multiprocessing.cpu_count()
+	pool = multiprocessing.Pool(processes)
+	max_pending = 2 * processes
+	pending = collections.deque()
+	(done, skipped) = (0, 0)
+
+	def write_next():
+		(data, invalid) = pending.popleft().get()
+		if invalid and not skip_invalid:
+			raise ValueError(
+				"key %d is not a valid compressed key" % (done + invalid[0])
+			)
+		out_file.write(data)
+		return (len(data) // uncompressed_size, len(invalid))
+
+	try:
+		for chunk in read_chunks(in_file, chunk_keys):
+			pending.append(pool.apply_async(decompress_chunk, (chunk, )))
+			if len(pending) >= max_pending:
+				(keys, invalid) = write_next()
+				(done, skipped) = (done + keys + invalid, skipped + invalid)
+		while pending:
+			(keys, invalid) = write_next()
+			(done, skipped) = (done + keys + invalid, skipped + invalid)
+		pool.close()
+	except:
+		pool.terminate()
+		raise
+	finally:
+		pool.join()
+
+	return (done - skipped, skipped)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(
+		description = "decompress 33 byte sec1 public keys into 65 byte keys"
+	)
+	parser.add_argument(
+		"in_file", nargs = "?", type = argparse.FileType("rb"),
+		default = sys.stdin, help = "compressed keys (default: stdin)"
+	)
+	parser.add_argument(
+		"out_file", nargs = "?", type = argparse.FileType("wb"),
+		default = sys.stdout, help = "uncompressed keys (default: stdout)"
+	)
+	parser.add_argument(
+		"--chunk", type = int, default = 4096,
+		help = "the number of keys per chunk of work"
+	)
+	parser.add_argument(
+		"--processes", type = int, default = None,
+		help = "the number of worker processes (default: one per cpu)"
+	)
+	parser.add_argument(
+		"--skip-invalid", action = "store_true",
+		help = "leave invalid keys out of the output instead of stopping"
+	)
+	args = parser.parse_args()
+
+	start = time.time()
+	try:
+		(keys, skipped) = decompress_file(
+			args.in_file, args.out_file, args.chunk, args.processes,
+			args.skip_invalid
+		)
+	except ValueError as exception:
+		sys.exit("error: %s" % exception)
+	finally:
+		args.out_file.flush()
+
+	duration = max(time.time() - start, 1e-6)
+	# report to stderr so as not to mix with the keys on stdout
+	sys.stderr.write(
+		"decompressed %d keys in %.1f seconds (%d keys per minute)\n"
+		% (keys, duration, keys * 60 / duration)
+	)
+	if skipped:
+		sys.stderr.write("skipped %d invalid keys\n" % skipped)
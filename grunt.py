@@ -9,8 +9,11 @@ performing live crypto operations.
 secp256k1_eq = "y^2 = x^3 + 7"
 
 from distutils.version import LooseVersion
-import sympy, mpmath, numpy, matplotlib, hashlib
+import sympy, mpmath, numpy, matplotlib, hashlib, multiprocessing, subprocess
+import errno, binascii, os, random, struct, itertools
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 
 if LooseVersion(mpmath.__version__) < LooseVersion("0.19"):
 	raise ImportError(
@@ -228,6 +231,1001 @@ def half_point(p, yq_pos):
 # end curve and line equations
 ################################################################################
 
+################################################################################
+# begin division polynomials
+################################################################################
+
+# the variable of the division polynomials, and the memo of those computed so
+# far - division_polynomial(n) is stored at division_polynomials[n]
+division_x = sympy.symbols("x")
+division_polynomials = {}
+
+def division_polynomial(n):
+	"""
+	return the nth division polynomial of the curve as a sympy Poly in x.
+
+	the division polynomials psi_n(x, y) are zero at exactly the points p where
+	np is the point at infinity, and they give np directly from p (see
+	multiply_point()). for y^2 = x^3 + 7 the first few are:
+
+	psi_0 = 0
+	psi_1 = 1
+	psi_2 = 2y
+	psi_3 = 3x^4 + 84x
+	psi_4 = 4y(x^6 + 140x^3 - 392)
+
+	and the rest follow from the recurrence:
+
+	psi_(2m + 1) = psi_(m + 2)psi_m^3 - psi_(m - 1)psi_(m + 1)^3
+	psi_(2m) = (psi_m / 2y)(psi_(m + 2)psi_(m - 1)^2 - psi_(m - 2)psi_(m + 1)^2)
+
+	psi_n contains exactly one factor of y when n is even and none when n is
+	odd, so this function returns f_n - ie psi_n for odd n and psi_n / y for
+	even n. this means every y^2 in the recurrence can be replaced with
+	x^3 + 7, and the polynomials are in x alone:
+
+	f_(2m + 1) = (x^3 + 7)^2 f_(m + 2)f_m^3 - f_(m - 1)f_(m + 1)^3 (m even)
+	f_(2m + 1) = f_(m + 2)f_m^3 - (x^3 + 7)^2 f_(m - 1)f_(m + 1)^3 (m odd)
+	f_(2m) = (f_m / 2)(f_(m + 2)f_(m - 1)^2 - f_(m - 2)f_(m + 1)^2)
+
+	the results are memoized, so computing psi_n also computes and stores every
+	psi that it depends on - around 2log2(n) of them.
+	"""
+	if n < 0:
+		# psi_(-n) = -psi_n
+		return -division_polynomial(-n)
+	if n in division_polynomials:
+		return division_polynomials[n]
+
+	x = division_x
+	if n <= 4:
+		f_n = sympy.Poly(
+			[0, 1, 2, 3 * x**4 + 84 * x, 4 * (x**6 + 140 * x**3 - 392)][n], x,
+			domain = "ZZ"
+		)
+	else:
+		f = division_polynomial
+		m = n // 2
+		if n % 2:
+			y_4 = sympy.Poly((x**3 + 7)**2, x, domain = "ZZ")
+			if m % 2:
+				f_n = f(m + 2) * f(m)**3 - y_4 * f(m - 1) * f(m + 1)**3
+			else:
+				f_n = y_4 * f(m + 2) * f(m)**3 - f(m - 1) * f(m + 1)**3
+		else:
+			f_n = (
+				f(m) * (f(m + 2) * f(m - 1)**2 - f(m - 2) * f(m + 1)**2)
+			).exquo_ground(2)
+
+	division_polynomials[n] = f_n
+	return f_n
+
+def multiply_point(k, p):
+	"""
+	either calculate and return the value of the coordinates of point kp, or
+	return the symbolic expressions for these coordinates - ie p added to itself
+	k times. rather than adding p over and over with add_points(), which gives
+	expressions that blow up before they can be simplified, use the division
+	polynomials (see division_polynomial()):
+
+	x_(kp) = x - psi_(k - 1)psi_(k + 1) / psi_k^2
+	y_(kp) = (psi_(k + 2)psi_(k - 1)^2 - psi_(k - 2)psi_(k + 1)^2) / 4y(psi_k^3)
+
+	replacing psi_n with f_n (or yf_n for even n) and y^2 with x^3 + 7 gives
+	x_(kp) as a rational function of xp alone, and y_(kp) as yp times a rational
+	function of xp. so the results are already fully simplified.
+	"""
+	if k < 0:
+		return negative(multiply_point(-k, p))
+	if k == 0:
+		raise ValueError("0p is the point at infinity")
+	(xp, yp) = p
+	x = division_x
+	f = division_polynomial
+	y_2 = sympy.Poly(x**3 + 7, x, domain = "ZZ")
+	if k % 2:
+		x_num = x * f(k)**2 - y_2 * f(k - 1) * f(k + 1)
+		x_den = f(k)**2
+		y_den = 4 * f(k)**3
+	else:
+		x_num = y_2 * x * f(k)**2 - f(k - 1) * f(k + 1)
+		x_den = y_2 * f(k)**2
+		y_den = 4 * y_2**2 * f(k)**3
+	y_num = f(k + 2) * f(k - 1)**2 - f(k - 2) * f(k + 1)**2
+	return (
+		x_num.as_expr(xp) / x_den.as_expr(xp),
+		yp * y_num.as_expr(xp) / y_den.as_expr(xp)
+	)
+
+################################################################################
+# end division polynomials
+################################################################################
+
+################################################################################
+# begin finite field points
+################################################################################
+
+# the secp256k1 domain parameters (see sec 2, section 2.4.1). the curve is
+# y^2 = x^3 + 7 (mod prime) and the generator point g has order n - ie n * g is
+# the point at infinity. these are called p and n in most texts, but p is used
+# for points everywhere else in this file.
+prime = 2**256 - 2**32 - 977
+order = 0xfffffffffffffffffffffffffffffffebaaedce6af48a03bbfd25e8cd0364141
+gx = 0x79be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798
+gy = 0x483ada7726a3c4655da4fbfc0e1108a8fd17b448a68554199c47d08ffb10d4b8
+
+def y_ec_mod(xp, yp_odd):
+	"""
+	the finite field version of y_ec() - return the value of y at point x = xp
+	on the curve y^2 = x^3 + 7 (mod prime).
+
+	there are two solutions, y and prime - y. since prime is odd, one of these
+	is odd and the other is even, so the yp_odd input picks between them just
+	like yp_pos does in y_ec().
+
+	prime = 3 (mod 4), so the square root is simply:
+	y = (x^3 + 7)^((prime + 1) / 4)
+	since y^2 = (x^3 + 7)^((prime + 1) / 2) = (x^3 + 7)(x^3 + 7)^((prime - 1) / 2)
+	and (x^3 + 7)^((prime - 1) / 2) = 1 whenever x^3 + 7 has a square root at
+	all (euler's criterion). if it does not then there is no point at x = xp.
+	"""
+	y_squared = (pow(xp, 3, prime) + 7) % prime
+	y = pow(y_squared, (prime + 1) // 4, prime)
+	if y * y % prime != y_squared:
+		raise ValueError("there is no point on the curve at x = %s" % xp)
+	return y if (y & 1) == yp_odd else prime - y
+
+class Point(object):
+	"""
+	a point on the curve over the finite field, with integer coordinates. the
+	point at infinity has x = y = None.
+
+	points can be unpacked just like the (x, y) tuples used elsewhere in this
+	file, ie (xp, yp) = p. __slots__ keeps each point down to the size of its
+	two coordinates.
+	"""
+	__slots__ = ("x", "y")
+
+	def __init__(self, x, y):
+		self.x = x
+		self.y = y
+
+	def __iter__(self):
+		return iter((self.x, self.y))
+
+	def __eq__(self, other):
+		try:
+			(x, y) = other
+		except (TypeError, ValueError):
+			# not a point or an (x, y) pair
+			return NotImplemented
+		return (self.x, self.y) == (x, y)
+
+	def __ne__(self, other):
+		equal = self.__eq__(other)
+		return equal if equal is NotImplemented else not equal
+
+	def __hash__(self):
+		return hash((self.x, self.y))
+
+	def __repr__(self):
+		if self.is_infinity():
+			return "Point(infinity)"
+		return "Point(0x%064x, 0x%064x)" % (self.x, self.y)
+
+	def is_infinity(self):
+		return self.x is None
+
+	def on_curve(self):
+		"""check that y^2 = x^3 + 7 (mod prime), with x and y in the field"""
+		if self.is_infinity():
+			return True
+		if not (0 <= self.x < prime and 0 <= self.y < prime):
+			return False
+		return (self.y**2 - self.x**3 - 7) % prime == 0
+
+	def encode(self, compressed = True):
+		"""
+		return the sec1 encoding of the point. compressed points are 33 bytes -
+		0x02 for even y or 0x03 for odd y, followed by the 32 byte x
+		coordinate. uncompressed points are 65 bytes - 0x04 followed by the x
+		and y coordinates. the point at infinity is the single byte 0x00.
+		"""
+		if self.is_infinity():
+			return "\x00"
+		if compressed:
+			return chr(2 + (self.y & 1)) + int_to_bytes(self.x)
+		return "\x04" + int_to_bytes(self.x) + int_to_bytes(self.y)
+
+	@staticmethod
+	def decode(data):
+		"""decode a sec1 encoded point and check that it is on the curve"""
+		return PointBatch.decode(data)[0]
+
+infinity = Point(None, None)
+g = Point(gx, gy)
+
+def int_to_bytes(i):
+	"""return integer i as 32 big-endian bytes"""
+	return binascii.unhexlify("%064x" % i)
+
+def ints_to_array(ints):
+	"""
+	convert a sequence of integers into an (n, 32) numpy array of big-endian
+	bytes. all the conversions happen in one hex string, which is far quicker
+	than converting each integer separately.
+	"""
+	data = binascii.unhexlify("".join("%064x" % i for i in ints))
+	return numpy.frombuffer(data, numpy.uint8).reshape(-1, 32) \
+	if len(data) else numpy.zeros((0, 32), numpy.uint8)
+
+def array_to_ints(array):
+	"""the reverse of ints_to_array() - return a list of integers"""
+	data = binascii.hexlify(numpy.ascontiguousarray(array).tostring())
+	return [int(data[i: i + 64], 16) for i in xrange(0, len(data), 64)]
+
+# the header at the start of every points file
+points_file_header = "secp256k1 points"
+# the number of points to encode at a time when writing a points file
+points_file_chunk = 2**16
+
+class PointBatch(object):
+	"""
+	a compact batch of points on the curve over the finite field, stored as a
+	struct of arrays - x and y are (n, 32) numpy arrays of big-endian
+	coordinates. so a batch takes 64 bytes per point, rather than the hundreds
+	of bytes of a list of Points.
+
+	the point at infinity is stored as (0, 0), which is not on the curve.
+
+	points files are a 16 byte header followed by one 65 byte uncompressed sec1
+	record per point. PointBatch.load() memory-maps these files, so the x and y
+	arrays are views straight into the file - loading and slicing a batch of
+	millions of points does not parse or even read anything until the points
+	are used.
+	"""
+	__slots__ = ("x", "y")
+
+	def __init__(self, x, y):
+		self.x = x
+		self.y = y
+
+	@classmethod
+	def from_points(cls, points):
+		"""create a batch from a sequence of Points or (x, y) tuples"""
+		xs = []
+		ys = []
+		for (x, y) in points:
+			xs.append(x or 0)
+			ys.append(y or 0)
+		return cls(ints_to_array(xs), ints_to_array(ys))
+
+	def __len__(self):
+		return len(self.x)
+
+	def __getitem__(self, i):
+		"""return a Point for an index or a (non-copied) PointBatch for a slice"""
+		if isinstance(i, slice):
+			return PointBatch(self.x[i], self.y[i])
+		if i < 0:
+			i += len(self)
+		if not 0 <= i < len(self):
+			raise IndexError("point index out of range")
+		x = int(binascii.hexlify(self.x[i].tostring()), 16)
+		y = int(binascii.hexlify(self.y[i].tostring()), 16)
+		return Point(x, y) if x or y else infinity
+
+	def __iter__(self):
+		for i in xrange(0, len(self), points_file_chunk):
+			for point in self.points(i, i + points_file_chunk):
+				yield point
+
+	def points(self, start = 0, stop = None):
+		"""return a list of Points for a range of the batch"""
+		xs = array_to_ints(self.x[start: stop])
+		ys = array_to_ints(self.y[start: stop])
+		return [
+			Point(x, y) if x or y else infinity for (x, y) in zip(xs, ys)
+		]
+
+	def infinities(self):
+		"""return a boolean array which is True at points at infinity"""
+		return ~(self.x.any(axis = 1) | self.y.any(axis = 1))
+
+	def encode(self, compressed = True):
+		"""
+		return the sec1 encoding of every point (see Point.encode()) as an
+		(n, 33) array for compressed points or an (n, 65) array for
+		uncompressed points. the point at infinity is encoded as a record of
+		zeros, since it has no fixed-length encoding.
+		"""
+		if compressed:
+			records = numpy.empty((len(self), 33), numpy.uint8)
+			# 0x02 for even y or 0x03 for odd y
+			records[:, 0] = 2 + (self.y[:, 31] & 1)
+		else:
+			records = numpy.empty((len(self), 65), numpy.uint8)
+			records[:, 0] = 4
+			records[:, 33:] = self.y
+		records[:, 1: 33] = self.x
+		records[self.infinities()] = 0
+		return records
+
+	@classmethod
+	def decode(cls, records):
+		"""
+		decode sec1 encoded points - either a string of concatenated encodings
+		or an (n, 33) or (n, 65) array as returned by encode(). compressed
+		points are decompressed with y_ec_mod(). raise a ValueError if any
+		point is not on the curve.
+		"""
+		if isinstance(records, str):
+			if records == "\x00":
+				return cls.from_points([infinity])
+			# the point at infinity is a record of zeros (see encode()), so the
+			# first non-zero byte is the prefix of the first other point
+			prefix = records.lstrip("\x00")[: 1]
+			if prefix:
+				width = 33 if prefix in "\x02\x03" else 65
+			else:
+				width = 33 if len(records) % 33 == 0 else 65
+			if len(records) % width:
+				raise ValueError(
+					"the data is not a whole number of %d byte points" % width
+				)
+			records = numpy.frombuffer(records, numpy.uint8).reshape(-1, width)
+
+		prefixes = records[:, 0]
+		x = records[:, 1: 33]
+		if records.shape[1] == 33:
+			if not numpy.in1d(prefixes, [0, 2, 3]).all():
+				raise ValueError("invalid compressed point prefix")
+			xs = array_to_ints(x)
+			if xs and max(xs) >= prime:
+				raise ValueError("x is larger than the field size")
+			ys = [
+				y_ec_mod(xp, yp_odd) if prefix else 0
+				for (xp, yp_odd, prefix) in zip(xs, prefixes & 1, prefixes)
+			]
+			batch = cls(x, ints_to_array(ys))
+		elif records.shape[1] == 65:
+			if not numpy.in1d(prefixes, [0, 4]).all():
+				raise ValueError("invalid uncompressed point prefix")
+			batch = cls(x, records[:, 33:])
+			for point in batch:
+				if not point.on_curve():
+					raise ValueError("%r is not on the curve" % (point, ))
+		else:
+			raise ValueError("sec1 points are either 33 or 65 bytes")
+
+		if (batch.infinities() != (prefixes == 0)).any():
+			raise ValueError("invalid encoding of the point at infinity")
+		return batch
+
+	def save(self, filename, append = False):
+		"""
+		write the batch to a points file, or add it to the end of an existing
+		points file. the points are encoded a chunk at a time, so this does not
+		need much more memory than the batch itself.
+		"""
+		with open(filename, "ab" if append else "wb") as f:
+			if f.tell() == 0:
+				f.write(points_file_header)
+			for i in xrange(0, len(self), points_file_chunk):
+				chunk = self[i: i + points_file_chunk]
+				chunk.encode(compressed = False).tofile(f)
+
+	@classmethod
+	def load(cls, filename, mode = "r"):
+		"""
+		memory-map a points file. use mode = "r+" to be able to modify the
+		points in the file through the batch.
+		"""
+		with open(filename, "rb") as f:
+			if f.read(len(points_file_header)) != points_file_header:
+				raise ValueError("%s is not a points file" % filename)
+			f.seek(0, 2)
+			if f.tell() == len(points_file_header):
+				# numpy cannot memory-map zero bytes
+				return cls(
+					numpy.zeros((0, 32), numpy.uint8),
+					numpy.zeros((0, 32), numpy.uint8)
+				)
+
+		records = numpy.memmap(
+			filename, numpy.uint8, mode, offset = len(points_file_header)
+		).reshape(-1, 65)
+		return cls(records[:, 1: 33], records[:, 33:])
+
+################################################################################
+# end finite field points
+################################################################################
+
+################################################################################
+# begin finite field point arithmetic
+################################################################################
+
+def inverse_mod(a, modulus = prime):
+	"""
+	return 1 / a (mod modulus). both prime and order are prime, so by fermat's
+	little theorem a^(modulus - 1) = 1, ie a * a^(modulus - 2) = 1.
+	"""
+	if a % modulus == 0:
+		raise ZeroDivisionError("%s has no inverse mod %s" % (a, modulus))
+	return pow(a, modulus - 2, modulus)
+
+def batch_inverse(values, modulus = prime):
+	"""
+	return the inverses of all the given values (mod modulus) using a single
+	call to inverse_mod() - ie simultaneous inversion (montgomery's trick).
+
+	take the running products a, ab, abc. then invert abc just once. now:
+	1 / c = ab * (1 / abc)
+	1 / ab = c * (1 / abc)
+	1 / b = a * (1 / ab)
+	and so on back down to the first value. this costs 3 multiplications per
+	value, which is far cheaper than an inversion each.
+	"""
+	products = []
+	product = 1
+	for value in values:
+		product = product * value % modulus
+		products.append(product)
+	if not products:
+		return []
+
+	inverse = inverse_mod(product, modulus)
+	inverses = [None] * len(products)
+	for i in xrange(len(products) - 1, 0, -1):
+		inverses[i] = inverse * products[i - 1] % modulus
+		inverse = inverse * values[i] % modulus
+	inverses[0] = inverse
+	return inverses
+
+def negative_mod(p):
+	"""
+	the finite field version of negative() - mirror point p about the line
+	y = prime / 2
+	"""
+	if p == infinity:
+		return infinity
+	(xp, yp) = p
+	return Point(xp, (prime - yp) % prime)
+
+def add_points_mod(p, q):
+	"""
+	the finite field version of add_points(). the slope and intersection are
+	calculated exactly as in slope() and intersection(), except that division
+	is multiplication by the inverse (mod prime). adding a point to its
+	negative gives the point at infinity, which is the identity.
+	"""
+	if p == infinity:
+		return Point(*q)
+	if q == infinity:
+		return Point(*p)
+	(xp, yp) = p
+	(xq, yq) = q
+	if xp == xq:
+		if (yp + yq) % prime == 0:
+			return infinity
+		# tangent slope
+		m = 3 * xp**2 * inverse_mod(2 * yp) % prime
+	else:
+		# non-tangent slope
+		m = (yp - yq) * inverse_mod(xp - xq) % prime
+	xr = (m**2 - xp - xq) % prime
+	yr = (m * (xr - xp) + yp) % prime
+	# mirror the intersection
+	return Point(xr, (prime - yr) % prime)
+
+# every addition above needs an inversion, which costs about as much as a
+# hundred multiplications. so longer calculations use jacobian coordinates
+# (x, y, z) instead, which represent the point (x / z^2, y / z^3) and need no
+# inversions until the final conversion back with from_jacobian(). the point
+# at infinity has z = 0. see http://hyperelliptic.org/EFD/g1p/auto-shortw-jacobian-0.html
+
+jacobian_infinity = (1, 1, 0)
+
+def from_jacobian(p):
+	"""convert jacobian point (x, y, z) back to a Point"""
+	(x, y, z) = p
+	if z == 0:
+		return infinity
+	z_inv = inverse_mod(z)
+	z_inv_squared = z_inv**2 % prime
+	return Point(x * z_inv_squared % prime, y * z_inv_squared * z_inv % prime)
+
+def batch_from_jacobian(points):
+	"""
+	convert a list of jacobian points back to Points, with a single
+	batch_inverse() for all of their z coordinates rather than an inversion
+	each
+	"""
+	z_inverses = iter(batch_inverse([z for (x, y, z) in points if z]))
+	converted = []
+	for (x, y, z) in points:
+		if z == 0:
+			converted.append(infinity)
+			continue
+		z_inv = next(z_inverses)
+		z_inv_squared = z_inv**2 % prime
+		converted.append(Point(
+			x * z_inv_squared % prime, y * z_inv_squared * z_inv % prime
+		))
+	return converted
+
+def double_jacobian(p):
+	"""return 2p for jacobian point p (the dbl-2009-l formulas)"""
+	(x, y, z) = p
+	if z == 0 or y == 0:
+		return jacobian_infinity
+	a = x**2 % prime
+	b = y**2 % prime
+	c = b**2 % prime
+	d = 2 * ((x + b)**2 - a - c) % prime
+	e = 3 * a
+	f = e**2 % prime
+	x3 = (f - 2 * d) % prime
+	y3 = (e * (d - x3) - 8 * c) % prime
+	z3 = 2 * y * z % prime
+	return (x3, y3, z3)
+
+def add_jacobian_affine(p, q):
+	"""
+	return p + q for jacobian point p and Point q (ie q has z = 1), which is
+	quicker than adding two jacobian points (the madd-2004-hmv formulas)
+	"""
+	if q == infinity:
+		return p
+	(x1, y1, z1) = p
+	(x2, y2) = q
+	if z1 == 0:
+		return (x2, y2, 1)
+	z1_squared = z1**2 % prime
+	u2 = x2 * z1_squared % prime
+	s2 = y2 * z1_squared * z1 % prime
+	h = (u2 - x1) % prime
+	r = (s2 - y1) % prime
+	if h == 0:
+		# same x coordinate - either the same point or its negative
+		return double_jacobian(p) if r == 0 else jacobian_infinity
+	h_squared = h**2 % prime
+	h_cubed = h_squared * h % prime
+	v = x1 * h_squared % prime
+	x3 = (r**2 - h_cubed - 2 * v) % prime
+	y3 = (r * (v - x3) - y1 * h_cubed) % prime
+	z3 = z1 * h % prime
+	return (x3, y3, z3)
+
+def multiply_point_mod(k, p):
+	"""
+	return k * p using the generic double-and-add method - ie for each bit of k
+	from the top down, double the running total and add p if the bit is set.
+	this takes 256 doublings and around 128 additions for a random k.
+	"""
+	return from_jacobian(multiply_jacobian(k, p))
+
+def multiply_jacobian(k, p):
+	"""multiply_point_mod() without the final conversion from jacobian"""
+	k %= order
+	total = jacobian_infinity
+	for bit in bin(k)[2:]:
+		total = double_jacobian(total)
+		if bit == "1":
+			total = add_jacobian_affine(total, p)
+	return total
+
+# the fixed-base table for multiplying the generator point g. k is split into
+# 256 / g_table_window windows of g_table_window bits, and the table holds every
+# possible value of each window multiplied by g:
+# j * 2^(g_table_window * i) * g for window i and j = 1 .. 2^g_table_window - 1
+# so k * g is just the sum of one table entry per non-zero window - ie at most
+# 32 additions and no doublings at all, at the cost of 8160 points (522kB).
+g_table_window = 8
+# kept next to this file, so every script shares the one table no matter which
+# dir it is run from
+g_table_file = os.path.join(
+	os.path.dirname(os.path.abspath(__file__)), "g_table.bin"
+)
+g_table = None
+
+def build_g_table(filename = g_table_file):
+	"""
+	compute the fixed-base table for g and save it as a points file (see
+	PointBatch.save()). this only ever needs to be done once.
+
+	each window's entries are found by repeatedly adding that window's base
+	point, and the next window's base is one more addition on from the last
+	entry - ie 2^g_table_window * base. the entries are all converted back from
+	jacobian coordinates at the end with batch_from_jacobian().
+
+	the table is written to a temporary file first and then renamed, so other
+	processes never map a partially written table, and a crash never leaves one
+	behind.
+	"""
+	entries = 2**g_table_window - 1
+	table = []
+	base = g
+	for i in xrange(256 // g_table_window):
+		total = jacobian_infinity
+		for j in xrange(entries):
+			total = add_jacobian_affine(total, base)
+			table.append(total)
+		base = from_jacobian(add_jacobian_affine(total, base))
+
+	tmp_filename = "%s.%d" % (filename, os.getpid())
+	try:
+		PointBatch.from_points(batch_from_jacobian(table)).save(tmp_filename)
+		os.rename(tmp_filename, filename)
+	except:
+		if os.path.exists(tmp_filename):
+			os.remove(tmp_filename)
+		raise
+
+def init_g_table(filename = g_table_file):
+	"""
+	memory-map the fixed-base table for g, building it first if the file does
+	not exist yet. nothing is copied or parsed, so this is instant, and every
+	process which maps the file (eg a multiprocessing pool) shares the same
+	pages of memory.
+	"""
+	global g_table
+	if not os.path.exists(filename):
+		build_g_table(filename)
+	table = PointBatch.load(filename)
+	if len(table) != (256 // g_table_window) * (2**g_table_window - 1):
+		raise ValueError(
+			"%s is not a %d bit window table for g" % (filename, g_table_window)
+		)
+	g_table = table
+
+def multiply_g(k):
+	"""
+	return k * g using the fixed-base table (see init_g_table(), which is called
+	automatically the first time). each window of k picks out one table entry
+	to add to the total - there are no doublings.
+	"""
+	return from_jacobian(multiply_g_jacobian(k))
+
+def multiply_g_jacobian(k):
+	"""multiply_g() without the final conversion from jacobian"""
+	if g_table is None:
+		init_g_table()
+	entries = 2**g_table_window - 1
+	k %= order
+	total = jacobian_infinity
+	i = 0
+	while k:
+		j = k & entries
+		if j:
+			total = add_jacobian_affine(total, g_table[i * entries + j - 1])
+		k >>= g_table_window
+		i += 1
+	return total
+
+def public_key(private_key):
+	"""the public key is the private key (an integer) multiplied by g"""
+	return multiply_g(private_key)
+
+def sign(z, private_key, k = None):
+	"""
+	return the ecdsa signature (r, s) of message hash z (an integer) using the
+	given private key:
+	r = x(k * g) (mod order)
+	s = (z + r * private_key) / k (mod order)
+	where k is a random nonce, unless one is given. never reuse k - the private
+	key can be calculated from two signatures with the same k.
+	"""
+	nonce = k
+	while True:
+		if nonce is None:
+			k = random.SystemRandom().randrange(1, order)
+		r = multiply_g(k).x % order
+		s = (z + r * private_key) * inverse_mod(k, order) % order
+		if r and s:
+			return (r, s)
+		if nonce is not None:
+			raise ValueError("nonce k gives an invalid signature")
+
+def divide_point_mod(p, d):
+	"""
+	the finite field version of point division - return the point q where
+	d * q = p.
+
+	over the infinite field, half_point() finds two different answers (and
+	dividing by anything other than 2 means solving ever harder equations).
+	but over the finite field all the points are multiples of g, and g has
+	prime order - ie order * g is the point at infinity. so every d (that is
+	not a multiple of the order) has an inverse 1 / d (mod order), and:
+
+	d * ((1 / d) * p) = (d / d) * p = p
+
+	so p / d = (1 / d) * p is a single, well defined point.
+	"""
+	return multiply_point_mod(inverse_mod(d, order), p)
+
+def half_point_mod(p):
+	"""the finite field version of half_point() - return p / 2"""
+	return divide_point_mod(p, 2)
+
+def divide_points_mod(points, divisors):
+	"""
+	return the list of points[i] / divisors[i] (see divide_point_mod()) for
+	many points at once. all the divisors are inverted with a single
+	batch_inverse() (mod order), each quotient is calculated in jacobian
+	coordinates (using the fixed-base table when the point is g), and then all
+	the quotients are converted back with a single batch_from_jacobian(). so
+	there are two inversions in total, rather than two per point.
+
+	a single divisor which is a multiple of the order would make the whole
+	batch_inverse() fail, so the divisors are checked first and the first bad
+	one is reported just as divide_point_mod() would report it.
+	"""
+	points = list(points)
+	divisors = list(divisors)
+	if len(points) != len(divisors):
+		raise ValueError("there must be one divisor for each point")
+	for (i, d) in enumerate(divisors):
+		if d % order == 0:
+			raise ZeroDivisionError(
+				"divisor %d (%s) has no inverse mod %s" % (i, d, order)
+			)
+	quotients = [
+		multiply_g_jacobian(d_inv) if p == g else multiply_jacobian(d_inv, p)
+		for (p, d_inv) in zip(points, batch_inverse(divisors, order))
+	]
+	return batch_from_jacobian(quotients)
+
+################################################################################
+# end finite field point arithmetic
+################################################################################
+
+################################################################################
+# begin discrete logs
+################################################################################
+
+# the header at the start of every baby step table file. it is followed by the
+# base point (32 byte big-endian x and y coordinates), the number of baby steps
+# (8 bytes, little-endian) and then the table records.
+baby_steps_file_header = "secp256k1 babies"
+baby_steps_header_size = len(baby_steps_file_header) + 64 + 8
+# each table record is the top 64 bits of the x coordinate of j * base (the
+# fingerprint) and j itself. records with j = baby_steps_empty are unused.
+baby_steps_dtype = numpy.dtype([("x", "<u8"), ("j", "<u4")])
+baby_steps_empty = 2**32 - 1
+# the most a baby step table can be filled before it is made bigger
+baby_steps_load = 0.7
+
+def x_fingerprints(points):
+	"""
+	return the top 64 bits of each point's x coordinate as a numpy array. the
+	point at infinity gets 0.
+	"""
+	return numpy.array([(p.x or 0) >> 192 for p in points], numpy.uint64)
+
+def baby_step_chunk(args):
+	"""
+	compute the fingerprints of j * base for j = start .. start + count - 1.
+	this runs in the worker processes.
+	"""
+	(base, start, count) = args
+	base = Point(*base)
+	total = multiply_jacobian(start, base)
+	points = []
+	for j in xrange(count):
+		points.append(total)
+		total = add_jacobian_affine(total, base)
+	return x_fingerprints(batch_from_jacobian(points))
+
+class BabyStepTable(object):
+	"""
+	the baby step table for solving discrete logs with the baby-step
+	giant-step method - ie finding k from q = k * base.
+
+	the table holds j * base for j = 1 .. baby_steps, keyed by the top 64 bits
+	of the x coordinate. it is an open-addressing hash table (with linear
+	probing) of 12 byte records, in a file which is memory-mapped rather than
+	loaded - so a table only needs to be built once and can then be shared by
+	any number of queries and processes.
+
+	since j * base and -j * base share the same x coordinate, each baby step
+	covers both +j and -j, so the giant steps can be 2 * baby_steps apart.
+	finding a k in the range 0 .. key_range then takes around
+	key_range / (2 * baby_steps) giant steps - so the number of baby steps sets
+	the split between the time to solve and the memory used by the table.
+	"""
+	def __init__(self, base, baby_steps, records):
+		self.base = base
+		self.baby_steps = baby_steps
+		self.records = records
+
+	@classmethod
+	def build(
+		cls, filename, baby_steps, base = g, processes = None, chunk = 2**14
+	):
+		"""
+		compute the baby steps in chunks in a pool of worker processes and
+		write the table to a file. return the table memory-mapped from that
+		file.
+		"""
+		if not 0 < baby_steps < baby_steps_empty:
+			raise ValueError("baby_steps must be between 1 and 2^32 - 2")
+		size = 1
+		while size * baby_steps_load < baby_steps:
+			size *= 2
+
+		with open(filename, "wb") as f:
+			f.write(baby_steps_file_header)
+			f.write(int_to_bytes(base.x) + int_to_bytes(base.y))
+			f.write(struct.pack("<Q", baby_steps))
+			f.truncate(
+				baby_steps_header_size + size * baby_steps_dtype.itemsize
+			)
+		table = cls.load(filename, mode = "r+")
+		table.records["j"] = baby_steps_empty
+
+		chunks = [
+			(tuple(base), start, min(chunk, baby_steps + 1 - start))
+			for start in xrange(1, baby_steps + 1, chunk)
+		]
+		pool = multiprocessing.Pool(processes)
+		try:
+			# insert each chunk as soon as it is computed
+			for ((base_xy, start, count), fingerprints) in itertools.izip(
+				chunks, pool.imap(baby_step_chunk, chunks)
+			):
+				js = numpy.arange(start, start + count, dtype = numpy.uint32)
+				table.insert(fingerprints, js)
+			pool.close()
+		except:
+			pool.terminate()
+			raise
+		finally:
+			pool.join()
+
+		table.records.flush()
+		return cls.load(filename)
+
+	@classmethod
+	def load(cls, filename, mode = "r"):
+		"""memory-map a baby step table file"""
+		with open(filename, "rb") as f:
+			header = f.read(baby_steps_header_size)
+		if not header.startswith(baby_steps_file_header) \
+		or len(header) != baby_steps_header_size:
+			raise ValueError("%s is not a baby step table" % filename)
+		i = len(baby_steps_file_header)
+		base = Point(
+			int(binascii.hexlify(header[i: i + 32]), 16),
+			int(binascii.hexlify(header[i + 32: i + 64]), 16)
+		)
+		(baby_steps, ) = struct.unpack("<Q", header[i + 64:])
+		records = numpy.memmap(
+			filename, baby_steps_dtype, mode, offset = baby_steps_header_size
+		)
+		return cls(base, baby_steps, records)
+
+	def slots(self, fingerprints):
+		"""return the first slot to probe for each fingerprint"""
+		return (fingerprints & numpy.uint64(len(self.records) - 1)).astype(int)
+
+	def insert(self, fingerprints, js):
+		"""
+		add the baby steps js with the given fingerprints to the table. this is
+		vectorized across all the baby steps - in each round every baby step
+		that has reached an empty slot is stored there (the first one wins if
+		several reach the same slot) and the rest move on to the next slot.
+		"""
+		slots = self.slots(fingerprints)
+		mask = len(self.records) - 1
+		while len(js):
+			empty = self.records["j"][slots] == baby_steps_empty
+			candidates = numpy.nonzero(empty)[0]
+			(unused, first) = numpy.unique(slots[candidates], return_index = True)
+			winners = candidates[first]
+			self.records["x"][slots[winners]] = fingerprints[winners]
+			self.records["j"][slots[winners]] = js[winners]
+
+			placed = numpy.zeros(len(js), bool)
+			placed[winners] = True
+			# baby steps which lost a race for an empty slot try it again, and
+			# find it full next time
+			slots[~empty] = (slots[~empty] + 1) & mask
+			(fingerprints, js, slots) = (
+				fingerprints[~placed], js[~placed], slots[~placed]
+			)
+
+	def lookup(self, fingerprints):
+		"""
+		return the baby step j for each fingerprint, or 0 where the fingerprint
+		is not in the table. vectorized across all the fingerprints like
+		insert().
+		"""
+		found = numpy.zeros(len(fingerprints), numpy.uint32)
+		slots = self.slots(fingerprints)
+		active = numpy.arange(len(fingerprints))
+		mask = len(self.records) - 1
+		while len(active):
+			records = self.records[slots[active]]
+			hit = records["x"] == fingerprints[active]
+			found[active[hit]] = records["j"][hit]
+			active = active[~hit & (records["j"] != baby_steps_empty)]
+			slots[active] = (slots[active] + 1) & mask
+		return found
+
+	def multiply(self, k):
+		"""return k * base, using the fixed-base table if base is g"""
+		if self.base == g:
+			return multiply_g(k)
+		return multiply_point_mod(k, self.base)
+
+	def solve(self, targets, key_range):
+		"""
+		find k in the range 0 .. key_range - 1 for each target point
+		q = k * base. return a list with k for each target, or None where there
+		is no such k.
+
+		all the targets take their giant steps together. at giant step i each
+		target is at r = q - i * 2 * baby_steps * base, and if r = [+/-]j * base
+		for a baby step j then k = i * 2 * baby_steps [+/-] j. moving every
+		target on to its next giant step needs an inversion each (see
+		add_points_mod()), so these are all done with a single batch_inverse().
+		"""
+		targets = [Point(*q) for q in targets]
+		stride = 2 * self.baby_steps
+		giant_steps = max(0, -(-(key_range - 1 - self.baby_steps) // stride))
+		(xs, ys) = negative_mod(self.multiply(stride))
+		logs = [None] * len(targets)
+		# the targets still being searched for, and where each one is at
+		active = range(len(targets))
+		positions = targets
+
+		for i in xrange(giant_steps + 1):
+			# check each target's position against the baby steps. a match is
+			# only a candidate, since the fingerprints are just 64 bits and do
+			# not say whether r is +j or -j.
+			js = self.lookup(x_fingerprints(positions))
+			(still_active, still_positions) = ([], [])
+			for (t, r, j) in zip(active, positions, js):
+				if r == infinity:
+					candidates = [i * stride]
+				else:
+					candidates = [i * stride + j, i * stride - j] if j else []
+				for k in candidates:
+					if 0 <= k < key_range and self.multiply(k) == targets[t]:
+						logs[t] = k
+						break
+				else:
+					still_active.append(t)
+					still_positions.append(r)
+			(active, positions) = (still_active, still_positions)
+			if not active or i == giant_steps:
+				break
+
+			# take the next giant step for all the remaining targets. the rare
+			# positions that land on the giant step (or its negative) and
+			# positions at infinity are handled separately.
+			usual = [
+				n for (n, r) in enumerate(positions)
+				if r != infinity and r.x != xs
+			]
+			inverses = iter(batch_inverse([positions[n].x - xs for n in usual]))
+			moved = list(positions)
+			for n in usual:
+				(xr, yr) = positions[n]
+				m = (yr - ys) * next(inverses) % prime
+				xn = (m**2 - xr - xs) % prime
+				moved[n] = Point(xn, (m * (xr - xn) - yr) % prime)
+			for n in set(xrange(len(positions))) - set(usual):
+				moved[n] = add_points_mod(positions[n], (xs, ys))
+			positions = moved
+
+		return logs
+
+################################################################################
+# end discrete logs
+################################################################################
+
 ################################################################################
 # begin functions for plotting graphs
 ################################################################################
@@ -369,6 +1367,210 @@ def finalize_plot_ec(img_filename = None):
 # end functions for plotting graphs
 ################################################################################
 
+################################################################################
+# begin functions for animating graphs
+################################################################################
+
+# the size of each animation frame in inches. multiply by animation_dpi to get
+# the size in pixels - ffmpeg needs both pixel dimensions to be even numbers.
+animation_size = (8, 6)
+animation_dpi = 100
+
+def chord_convergence_frames(p, xq_start, num_frames):
+	"""
+	precompute the coordinates for every frame of point q sliding along the
+	curve towards point p, in a single vectorized pass over all frames.
+
+	q starts at x = xq_start in the same half of the curve as p. the final frame
+	has q = p, so the line through p and q in that frame is the tangent at p.
+
+	return numpy arrays (xq, yq, xr, yr) with one element per frame, where
+	(xr, yr) is the third intersection of the line through p and q with the
+	curve (see intersection()).
+	"""
+	p = (xp, yp) = (float(p[0]), float(p[1]))
+	xq = numpy.linspace(xq_start, xp, num_frames)
+	yq = numpy.copysign(numpy.sqrt(xq**3 + 7), yp)
+	m = numpy.empty(num_frames)
+	# non_tan_slope() and y_line() work on numpy arrays just as well as on
+	# scalars and sympy expressions. only the last frame is a tangent.
+	m[: -1] = non_tan_slope(p, (xq[: -1], yq[: -1]))
+	m[-1] = tan_slope(p)
+	xr = m**2 - xp - xq
+	yr = y_line(xr, p, m)
+	return (xq, yq, xr, yr)
+
+def orbit_frames(p, num_frames):
+	"""
+	precompute the coordinates for every frame of the orbit of point p under
+	repeated addition - ie p + p, p + 2p, p + 3p, etc. each point depends on the
+	previous one so this cannot be vectorized, but it is done in floats in a
+	single pass before any rendering starts.
+
+	return numpy arrays (xq, yq, xr, yr) with one element per frame, where frame
+	i shows the line through p and q = (i + 1)p and its third intersection with
+	the curve (xr, yr). mirroring r about the x-axis gives (i + 2)p.
+	"""
+	p = (float(p[0]), float(p[1]))
+	q = p
+	frames = numpy.empty((num_frames, 4))
+	for i in xrange(num_frames):
+		(xr, yr) = intersection(p, q)
+		frames[i] = (q[0], q[1], xr, yr)
+		q = (xr, -yr)
+	return tuple(frames.T)
+
+def init_animation(p, p_name = "p", x_max = 7, color = "b", line_color = "r"):
+	"""
+	initialize the animation figure - plot the curve and point p once, render
+	it and keep the resulting pixels as the background for every frame. each
+	frame then only has to restore this background and draw its own lines and
+	points over the top (ie blitting).
+
+	the figure is kept in module globals so that the worker processes forked by
+	animate() share the pre-drawn background instead of each redrawing it. this
+	uses the agg canvas directly (not pyplot) so that no gui is involved.
+	"""
+	global anim_fig, anim_ax, anim_background, anim_artists, anim_p
+	anim_p = (xp, yp) = (float(p[0]), float(p[1]))
+	x_min = -(7**(1 / 3.0))
+	y_max = float(y_ec(x_max, yp_pos = True))
+
+	anim_fig = Figure(figsize = animation_size, dpi = animation_dpi)
+	FigureCanvasAgg(anim_fig)
+	anim_ax = anim_fig.add_subplot(111)
+	anim_ax.grid(True)
+	x_array = numpy.linspace(x_min, x_max, curve_steps)
+	y_array = numpy.sqrt(x_array**3 + 7)
+	anim_ax.plot(x_array, y_array, color)
+	anim_ax.plot(x_array, -y_array, color)
+	anim_ax.plot(xp, yp, "%so" % line_color)
+	if len(p_name):
+		anim_ax.text(
+			xp - (x_max - x_min) / 20, yp + y_max / 10, "$%s$" % p_name
+		)
+	anim_ax.set_xlabel("$x$")
+	anim_ax.set_ylabel("$y$")
+	anim_ax.set_title("secp256k1: $%s$" % secp256k1_eq)
+	# fix the axes so that lines leaving the plot area do not rescale it
+	anim_ax.axis([x_min, x_max, -y_max, y_max])
+
+	# the chord through p and q, the vertical line from r to -r, and the
+	# points q and -r. these change every frame so they are not part of the
+	# background.
+	anim_artists = (
+		anim_ax.plot([], [], line_color, animated = True)[0],
+		anim_ax.plot([], [], line_color, animated = True)[0],
+		anim_ax.plot([], [], "%so" % line_color, animated = True)[0]
+	)
+	anim_fig.canvas.draw()
+	anim_background = anim_fig.canvas.copy_from_bbox(anim_fig.bbox)
+
+def render_animation_frame(frame):
+	"""
+	render a single frame (xq, yq, xr, yr) over the pre-drawn background and
+	return its raw rgba pixels. this runs in the worker processes.
+	"""
+	(xq, yq, xr, yr) = frame
+	(chord, vertical, points) = anim_artists
+	canvas = anim_fig.canvas
+	canvas.restore_region(anim_background)
+
+	# p, q and r all lie on the chord, so it spans the leftmost to the
+	# rightmost of them
+	ends = sorted([anim_p, (xq, yq), (xr, yr)])
+	chord.set_data([ends[0][0], ends[-1][0]], [ends[0][1], ends[-1][1]])
+	vertical.set_data([xr, xr], [yr, -yr])
+	points.set_data([xq, xr], [yq, -yr])
+	for artist in anim_artists:
+		anim_ax.draw_artist(artist)
+
+	return bytes(canvas.buffer_rgba())
+
+def animate(frames, img_filename, fmt = "gif", fps = 30, processes = None):
+	"""
+	render the precomputed frames (xq, yq, xr, yr) - as returned by
+	chord_convergence_frames() or orbit_frames() - onto the figure set up by
+	init_animation() and encode them as img/<img_filename>.<fmt>, where fmt is
+	any format ffmpeg can write, eg "gif" or "mp4".
+
+	frames are rendered in a pool of worker processes and streamed to ffmpeg in
+	order as they arrive, so the full animation is never held in memory. in
+	markdown mode a link to the animation is written to the markdown file.
+	"""
+	(width, height) = anim_fig.canvas.get_width_height()
+	img_path = "img/%s.%s" % (img_filename, fmt)
+	command = [
+		"ffmpeg", "-y", "-loglevel", "error",
+		"-f", "rawvideo", "-pix_fmt", "rgba", "-s", "%dx%d" % (width, height),
+		"-r", str(fps), "-i", "-"
+	]
+	if fmt == "mp4":
+		# most players can only handle yuv420p h.264 video
+		command += ["-pix_fmt", "yuv420p"]
+	command.append(img_path)
+	try:
+		encoder = subprocess.Popen(command, stdin = subprocess.PIPE)
+	except OSError as exception:
+		if exception.errno != errno.ENOENT:
+			raise
+		raise OSError(
+			"ffmpeg is required to render animations. install it with `sudo"
+			" apt-get install ffmpeg`"
+		)
+
+	pool = multiprocessing.Pool(processes)
+	try:
+		for pixels in pool.imap(
+			render_animation_frame, zip(*frames), chunksize = 8
+		):
+			encoder.stdin.write(pixels)
+		pool.close()
+	except:
+		pool.terminate()
+		encoder.kill()
+		raise
+	finally:
+		pool.join()
+		encoder.stdin.close()
+
+	if encoder.wait() != 0:
+		raise OSError("ffmpeg failed to encode %s" % img_path)
+
+	try:
+		save = markdown
+	except:
+		save = False
+
+	if save:
+		link = "![%s](%s)" if fmt == "gif" else "[%s](%s)"
+		quick_write(link % (img_filename, img_path))
+
+def animate_chord_convergence(
+	p, xq_start, img_filename, num_frames = 300, x_max = 7, **kwargs
+):
+	"""
+	animate point q sliding along the curve from x = xq_start towards point p,
+	showing the line through p and q becoming the tangent at p. any extra
+	keyword arguments are passed to animate().
+	"""
+	init_animation(p, x_max = x_max, color = "y")
+	frames = chord_convergence_frames(p, xq_start, num_frames)
+	animate(frames, img_filename, **kwargs)
+
+def animate_orbit(p, img_filename, num_frames = 300, x_max = 7, **kwargs):
+	"""
+	animate the orbit of point p under repeated addition (2p, 3p, 4p, ...). any
+	extra keyword arguments are passed to animate().
+	"""
+	init_animation(p, x_max = x_max)
+	frames = orbit_frames(p, num_frames)
+	animate(frames, img_filename, **kwargs)
+
+################################################################################
+# end functions for animating graphs
+################################################################################
+
 ############################################################################
 # begin functions for saving/displaying math equations and text
 ############################################################################
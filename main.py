@@ -11,9 +11,10 @@ secp256k1_eq = "y^2 = x^3 + 7"
 md_file = "README.md"
 import sys
 markdown = True if "-m" in sys.argv else False
+animations = True if "-a" in sys.argv else False
 init_grunt_globals(markdown, md_file)
 
-if markdown:
+if markdown or animations:
 	import os, errno
 	# create the img directory to store the graph and equation images in
 	try:
@@ -22,6 +23,7 @@ if markdown:
 		if exception.errno != errno.EEXIST:
 			raise
 
+if markdown:
 	# clear the md_file, ready for writing again
 	try:
 		os.remove(md_file)
@@ -54,7 +56,8 @@ run like so:
 
 to generate this git markdown file and images. run without the `-m` (markdown)
 flag to step through the tutorial image by image using matplotlib (enables
-zooming) in your shell.
+zooming) in your shell. add the `-a` flag to also render animations (requires
+`ffmpeg`).
 
 1. [point addition (infinite field)](#1-point-addition-infinite-field)
 2. [subtraction and halving (infinite field)](#2-subtraction-and-halving-infinite-field)
@@ -148,6 +151,10 @@ plot_add(p, q3, "", "", "", color = "g")
 
 finalize_plot_ec("point_addition3")
 
+if animations:
+	quick_write("or watch `q` slide all the way to `p`:")
+	animate_chord_convergence(p, xq_start = 0, img_filename = "point_addition4")
+
 quick_write(
 """clearly as `q` approaches `p`, the line between `q` and `p` approaches the
 tangent at `p`. and at `q = p` this line *is* the tangent. so a point can be
@@ -303,6 +310,17 @@ quick_write(
 identical. this means that addition and multiplication of points on the bitcoin
 elliptic curve really does work the same way as regular addition and
 multiplication!
+
+adding `p` to itself over and over like this quickly gets out of hand though -
+the expressions grow so fast that simplifying them takes far longer than
+computing them. luckily the coordinates of `kp` can be calculated directly from
+the *division polynomials* of the curve (see `multiply_point()` in `grunt.py`),
+and they come out already simplified. for example at `4p`, `x` is:"""
+)
+(x4p, y4p) = multiply_point(4, p)
+quick_equation(eq = x4p, latex = "x_{(4p)} = %s" % sympy.latex(x4p))
+quick_write(
+"""which is the same as above, without any simplification at all.
 %s
 ### 2. subtraction and halving (infinite field)
 
@@ -375,12 +393,27 @@ later on.
 %s
 ### 3. point addition (finite field)
 ### 4. subtraction and halving (finite field)
-### 5. bitcoin master public keys
+
+over a finite field, halving a point has just one answer. all the points used in
+bitcoin are multiples of the generator point `g`, and adding `g` to itself `n`
+times arrives back at the point at infinity, where `n` (the order of `g`) is a
+prime number. so every number `d` has an inverse `1 / d (mod n)`, and dividing
+point `p` by `d` is just multiplying `p` by `1 / d (mod n)`. for example, halving
+`g`:"""
+% hr
+)
+half_g = half_point_mod(g)
+quick_write("    g / 2 = (0x%x, 0x%x)" % tuple(half_g))
+quick_write("and doubling the result gives `g` again:")
+two_half_g = add_points_mod(half_g, half_g)
+quick_write("    g / 2 + g / 2 = (0x%x, 0x%x)" % tuple(two_half_g))
+quick_write("    g = (0x%x, 0x%x)" % tuple(g))
+quick_write(
+"""### 5. bitcoin master public keys
 ### 6. signing a message
 ### 7. verifying a message signature
 ### 8. recovering a public key from a signature
 ### 9. cracking a private key"""
-% hr
 )
 # don't set k too high or it will produce huge numbers that cannot be
 # computed and plotted. k = 7 seems to be about the limit for this simple
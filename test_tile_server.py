@@ -0,0 +1,94 @@
+#!/usr/bin/env python2.7
+
+"""
+tests for the tile cache in tile_server.py. run like so:
+
+    python -m unittest test_tile_server
+"""
+
+import unittest, threading, tempfile, shutil, time, multiprocessing.pool
+from tile_server import *
+
+class SlowPool(object):
+	"""
+	a stand-in for a multiprocessing pool which renders tiles slowly in a
+	thread, so that concurrent requests all arrive while the render is still
+	going. it counts the renders and can be made to fail.
+	"""
+	def __init__(self, error = None):
+		self.renders = 0
+		self.error = error
+
+	def apply_async(self, func, args):
+		self.renders += 1
+		pool = multiprocessing.pool.ThreadPool(1)
+		def render(*key):
+			time.sleep(0.2)
+			if self.error is not None:
+				raise self.error
+			return func(*key)
+		result = pool.apply_async(render, args)
+		pool.close()
+		return result
+
+class TestTileCache(unittest.TestCase):
+	def setUp(self):
+		self.scene = init_scene(10, yp_pos = True)
+		init_tile_worker(self.scene)
+		self.cache_dir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.cache_dir)
+
+	def get_concurrently(self, tiles, requests = 5):
+		"""request tile (5, 3, 7) from several threads at once"""
+		results = []
+		def get():
+			try:
+				results.append(tiles.get(5, 3, 7))
+			except Exception as exception:
+				results.append(exception)
+		threads = [threading.Thread(target = get) for i in xrange(requests)]
+		for thread in threads:
+			thread.daemon = True
+			thread.start()
+		for thread in threads:
+			thread.join(30)
+			self.assertFalse(thread.is_alive(), "a request never returned")
+		return results
+
+	def test_concurrent_requests_for_the_same_tile(self):
+		pool = SlowPool()
+		tiles = TileCache(pool, self.cache_dir)
+		results = self.get_concurrently(tiles)
+		self.assertEqual(pool.renders, 1)
+		self.assertEqual(len(results), 5)
+		self.assertEqual(len(set(results)), 1)
+		self.assertTrue(results[0].startswith("\x89PNG"))
+		# the tile is no longer being rendered, and later requests get it
+		self.assertEqual(tiles.rendering, {})
+		self.assertEqual(tiles.get(5, 3, 7), results[0])
+		self.assertEqual(pool.renders, 1)
+
+	def test_concurrent_requests_with_a_process_pool(self):
+		pool = multiprocessing.Pool(
+			2, initializer = init_tile_worker, initargs = (self.scene, )
+		)
+		try:
+			results = self.get_concurrently(TileCache(pool, self.cache_dir))
+		finally:
+			pool.terminate()
+		self.assertEqual(len(set(results)), 1)
+		self.assertTrue(results[0].startswith("\x89PNG"))
+
+	def test_render_error_reaches_every_request(self):
+		pool = SlowPool(error = ValueError("bad tile"))
+		tiles = TileCache(pool, self.cache_dir)
+		results = self.get_concurrently(tiles)
+		self.assertEqual(len(results), 5)
+		for result in results:
+			self.assertIsInstance(result, ValueError)
+		self.assertEqual(tiles.rendering, {})
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,402 @@
+#!/usr/bin/env python2.7
+
+"""
+a local http tile server for deep-zoom exploration of the bitcoin elliptic
+curve and the addition chords used to check that p + p + p + p = 2p + 2p (see
+plot_4p() in main.py). this is a stand-in for a web front end.
+
+run like so:
+
+    ./tile_server.py --xp 10
+
+then browse to http://localhost:8000/ to pan and zoom around the curve, or fetch
+256x256 png tiles directly from http://localhost:8000/<zoom>/<x>/<y>.png. at
+zoom level z the plot area is split into 2^z by 2^z tiles, with tile (0, 0) at
+the top left.
+
+the tiles themselves are all rendered and served locally, but the page at
+http://localhost:8000/ uses the leaflet map library, which the browser loads
+from https://unpkg.com. so browsing needs internet access (the page says so if
+leaflet cannot be loaded) - fetching the tiles directly does not.
+
+tiles are rendered on demand in a pool of worker processes and kept in an lru
+cache in memory and in the tiles/ dir on disk, so any area (eg the 2p/3p
+intersection) only needs to be rendered once. use --prerender to render all
+tiles upto a given zoom level before the server starts.
+"""
+
+from grunt import *
+import os, re, errno, argparse, threading, collections, itertools
+from cStringIO import StringIO
+import BaseHTTPServer, SocketServer
+
+tile_size = 256 # pixels
+# float64 coordinates run out of precision somewhere beyond this zoom level
+max_zoom = 40
+
+################################################################################
+# begin functions for rendering tiles
+################################################################################
+
+def init_scene(xp, yp_pos):
+	"""
+	compute the points and addition chords to draw on the tiles for point p at
+	x = xp. these are the same chords as in plot_4p() in main.py. the
+	coordinates are computed exactly with sympy then converted to floats, since
+	the tiles are rendered in worker processes and must be picklable.
+
+	return a dict with the plot area bounds (x_min, x_max, y_min, y_max) and a
+	list of chords - each chord is (p, q, r, color) where r is the third
+	intersection of the line through p and q with the curve.
+	"""
+	yp = y_ec(xp, yp_pos)
+	p = (xp, yp)
+	two_p = add_points(p, p)
+	three_p = add_points(p, two_p)
+	chords = []
+	for (a, b, color) in [
+		(p, p, "r"), (p, two_p, "c"), (p, three_p, "g"), (two_p, two_p, "b")
+	]:
+		(xr, yr) = intersection(a, b)
+		chords.append((
+			(float(a[0]), float(a[1])), (float(b[0]), float(b[1])),
+			(float(xr), float(yr)), color
+		))
+
+	# the same plot area as init_plot_ec(rightmost_x + 2) in plot_4p()
+	x_max = max(max(a[0], b[0], r[0]) for (a, b, r, color) in chords) + 2
+	y_max = float(y_ec(x_max, yp_pos = True))
+	return {
+		"name": "4p_x%s_%s" % (xp, "top" if yp_pos else "bottom"),
+		"bounds": (-(7**(1 / 3.0)), x_max, -y_max, y_max),
+		"chords": chords
+	}
+
+def init_tile_worker(scene_local):
+	"""initialize the scene global in each tile rendering process"""
+	global scene
+	scene = scene_local
+
+def tile_bounds(z, x, y):
+	"""return the plot area (x_min, x_max, y_min, y_max) covered by a tile"""
+	(x0, x1, y0, y1) = scene["bounds"]
+	width = (x1 - x0) / 2**z
+	height = (y1 - y0) / 2**z
+	# tile rows are counted from the top down
+	return (
+		x0 + x * width, x0 + (x + 1) * width,
+		y1 - (y + 1) * height, y1 - y * height
+	)
+
+def render_tile(z, x, y):
+	"""
+	render a single tile and return it as png data. this runs in the worker
+	processes.
+
+	the curve is plotted twice within the tile - once sampled along x as
+	y = [+/-]sqrt(x^3 + 7) and once sampled along y as x = cuberoot(y^2 - 7).
+	the first is accurate where the curve is flat and the second where it is
+	steep (eg near x = -cuberoot(7)), so the curve stays smooth no matter how
+	far in the tile is zoomed. labels are left off since they would be cut off
+	at the tile edges.
+	"""
+	(x_min, x_max, y_min, y_max) = tile_bounds(z, x, y)
+	# use the default dpi so lines and points are the same size as in the
+	# other graphs
+	fig = Figure(figsize = (tile_size / 100.0, tile_size / 100.0), dpi = 100)
+	canvas = FigureCanvasAgg(fig)
+	ax = fig.add_axes([0, 0, 1, 1])
+	ax.axis("off")
+
+	# the x and y axes
+	ax.axhline(0, color = "0.8")
+	ax.axvline(0, color = "0.8")
+
+	x_array = numpy.linspace(max(x_min, -(7**(1 / 3.0))), x_max, tile_size)
+	y_array = numpy.sqrt(x_array**3 + 7)
+	ax.plot(x_array, y_array, "y", x_array, -y_array, "y")
+	y_array = numpy.linspace(y_min, y_max, tile_size)
+	x_array = y_array**2 - 7
+	x_array = numpy.sign(x_array) * numpy.abs(x_array)**(1 / 3.0)
+	ax.plot(x_array, y_array, "y")
+
+	for (p, q, r, color) in scene["chords"]:
+		# the chord through p and q spans the leftmost to the rightmost of p, q
+		# and r. then the vertical line from r to -r.
+		ends = sorted([p, q, r])
+		ax.plot([ends[0][0], ends[-1][0]], [ends[0][1], ends[-1][1]], color)
+		ax.plot([r[0], r[0]], [r[1], -r[1]], color)
+		ax.plot([p[0], q[0], r[0]], [p[1], q[1], -r[1]], "%so" % color)
+
+	# set the limits last - plotting would otherwise rescale them
+	ax.axis([x_min, x_max, y_min, y_max])
+	png = StringIO()
+	canvas.print_png(png)
+	return png.getvalue()
+
+################################################################################
+# end functions for rendering tiles
+################################################################################
+
+################################################################################
+# begin tile cache
+################################################################################
+
+class PendingTile(object):
+	"""
+	a tile which is being rendered. only the request which started the render
+	waits on the pool for it - any other requests for the same tile wait on
+	done instead, which the first request sets once png (or error) is stored.
+	the pool's own result cannot be shared, since in python 2.7 it only wakes
+	one of the threads waiting on it.
+	"""
+	def __init__(self):
+		self.done = threading.Event()
+		self.png = None
+		self.error = None
+
+class TileCache(object):
+	"""
+	an lru cache of rendered tiles in memory, backed by an on-disk cache in
+	cache_dir/<zoom>/<x>/<y>.png. tiles missing from both are rendered in the
+	given pool of worker processes. requests for a tile which is already being
+	rendered wait for that render rather than starting another one.
+	"""
+	def __init__(self, pool, cache_dir, max_tiles = 1024):
+		self.pool = pool
+		self.cache_dir = cache_dir
+		self.max_tiles = max_tiles
+		self.tiles = collections.OrderedDict()
+		self.rendering = {}
+		self.lock = threading.Lock()
+
+	def tile_path(self, z, x, y):
+		return os.path.join(self.cache_dir, str(z), str(x), "%d.png" % y)
+
+	def remember(self, key, png):
+		"""add a tile to the memory cache. the lock must be held."""
+		self.tiles[key] = png
+		if len(self.tiles) > self.max_tiles:
+			# discard the least recently used tile
+			self.tiles.popitem(last = False)
+
+	def save(self, key, png):
+		"""write a tile to the disk cache"""
+		path = self.tile_path(*key)
+		try:
+			os.makedirs(os.path.dirname(path))
+		except OSError as exception:
+			if exception.errno != errno.EEXIST:
+				raise
+		# write to a temporary file first so that other threads and processes
+		# never see a partially written tile
+		tmp_path = "%s.%d.%s" % (
+			path, os.getpid(), threading.current_thread().name
+		)
+		with open(tmp_path, "wb") as f:
+			f.write(png)
+		os.rename(tmp_path, path)
+
+	def get(self, z, x, y):
+		"""return the png data for a tile, rendering it if necessary"""
+		key = (z, x, y)
+		with self.lock:
+			if key in self.tiles:
+				png = self.tiles.pop(key)
+				# move it to the most recently used end
+				self.tiles[key] = png
+				return png
+			pending = self.rendering.get(key)
+
+		if pending is None:
+			try:
+				with open(self.tile_path(*key), "rb") as f:
+					png = f.read()
+				with self.lock:
+					self.remember(key, png)
+				return png
+			except IOError as exception:
+				if exception.errno != errno.ENOENT:
+					raise
+
+			with self.lock:
+				pending = self.rendering.get(key)
+				if pending is None:
+					pending = PendingTile()
+					self.rendering[key] = pending
+					owner = True
+				else:
+					owner = False
+		else:
+			owner = False
+
+		if not owner:
+			pending.done.wait()
+			if pending.error is not None:
+				raise pending.error
+			return pending.png
+
+		try:
+			png = self.pool.apply_async(render_tile, key).get()
+			self.save(key, png)
+			with self.lock:
+				self.remember(key, png)
+			pending.png = png
+		except Exception as exception:
+			pending.error = exception
+			raise
+		finally:
+			with self.lock:
+				del self.rendering[key]
+			pending.done.set()
+		return png
+
+	def prerender(self, zoom):
+		"""render all tiles upto and including the given zoom level to disk"""
+		keys = [
+			(z, x, y)
+			for z in xrange(zoom + 1)
+			for x in xrange(2**z)
+			for y in xrange(2**z)
+			if not os.path.exists(self.tile_path(z, x, y))
+		]
+		# save each tile as soon as it is rendered, rather than holding them all
+		tiles = itertools.izip(keys, self.pool.imap(render_tile_key, keys))
+		for (key, png) in tiles:
+			self.save(key, png)
+
+def render_tile_key(key):
+	"""render_tile() for pool.imap(), which only passes a single argument"""
+	return render_tile(*key)
+
+################################################################################
+# end tile cache
+################################################################################
+
+################################################################################
+# begin http server
+################################################################################
+
+# a minimal front end for panning and zooming around the tiles. leaflet is
+# loaded from unpkg.com (see the docstring at the top of this file).
+leaflet_url = "https://unpkg.com/leaflet@1.9.4/dist/leaflet"
+index_html = """<!DOCTYPE html>
+<html>
+<head>
+<title>secp256k1: %s</title>
+<link rel="stylesheet" href="%s.css">
+<script src="%s.js"></script>
+<style>html, body, #map { height: 100%%; margin: 0; }</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+if (typeof L === "undefined") {
+	document.getElementById("map").innerHTML = "the leaflet map library" +
+	" could not be loaded from unpkg.com - this page needs internet access." +
+	" the tiles can still be fetched directly from" +
+	" /&lt;zoom&gt;/&lt;x&gt;/&lt;y&gt;.png";
+} else {
+	var map = L.map("map", {crs: L.CRS.Simple, maxZoom: %d});
+	L.tileLayer("/{z}/{x}/{y}.png", {
+		maxZoom: %d, tileSize: %d, noWrap: true, bounds: [[-%d, 0], [0, %d]]
+	}).addTo(map);
+	map.fitBounds([[-%d, 0], [0, %d]]);
+}
+</script>
+</body>
+</html>
+""" % (
+	(secp256k1_eq, leaflet_url, leaflet_url, max_zoom, max_zoom)
+	+ (tile_size, ) * 5
+)
+
+tile_re = re.compile(r"^/(\d+)/(\d+)/(\d+)\.png$")
+
+class TileRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	def do_GET(self):
+		if self.path == "/":
+			self.respond("text/html", index_html)
+			return
+
+		match = tile_re.match(self.path)
+		if match is None:
+			self.send_error(404)
+			return
+
+		(z, x, y) = [int(i) for i in match.groups()]
+		if z > max_zoom or x >= 2**z or y >= 2**z:
+			self.send_error(404)
+			return
+
+		self.respond("image/png", self.server.tiles.get(z, x, y))
+
+	def respond(self, content_type, body):
+		self.send_response(200)
+		self.send_header("Content-Type", content_type)
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+class TileServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	"""serve each request in its own thread so tiles are rendered concurrently"""
+	daemon_threads = True
+
+	def __init__(self, address, tiles):
+		BaseHTTPServer.HTTPServer.__init__(self, address, TileRequestHandler)
+		self.tiles = tiles
+
+################################################################################
+# end http server
+################################################################################
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(
+		description = "serve png tiles of the secp256k1 curve at any zoom level",
+		epilog = "the tiles are served locally, but the map page at / loads the"
+		" leaflet library from unpkg.com, so browsing it needs internet access"
+	)
+	parser.add_argument("--port", type = int, default = 8000)
+	parser.add_argument(
+		"--xp", type = float, default = 10, help = "the x coordinate of p"
+	)
+	parser.add_argument(
+		"--bottom", action = "store_true",
+		help = "put p in the bottom half of the curve"
+	)
+	parser.add_argument(
+		"--prerender", type = int, default = -1, metavar = "ZOOM",
+		help = "render all tiles upto this zoom level before serving"
+	)
+	parser.add_argument(
+		"--cache-size", type = int, default = 1024,
+		help = "the number of tiles to keep in memory"
+	)
+	parser.add_argument(
+		"--processes", type = int, default = None,
+		help = "the number of tile rendering processes (default: one per cpu)"
+	)
+	args = parser.parse_args()
+
+	xp = int(args.xp) if args.xp == int(args.xp) else args.xp
+	scene = init_scene(xp, yp_pos = not args.bottom)
+	init_tile_worker(scene)
+	pool = multiprocessing.Pool(
+		args.processes, initializer = init_tile_worker, initargs = (scene, )
+	)
+	tiles = TileCache(
+		pool, os.path.join("tiles", scene["name"]), max_tiles = args.cache_size
+	)
+	if args.prerender >= 0:
+		print "prerendering tiles upto zoom level %d..." % args.prerender
+		tiles.prerender(args.prerender)
+
+	server = TileServer(("localhost", args.port), tiles)
+	print "serving tiles at http://localhost:%d/" % args.port
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		pool.terminate()